@@ -0,0 +1,86 @@
+"""
+Compare safetensors_writer.save_file with safetensors.torch.save_file.
+
+    python benchmarks/bench_safetensors_writer.py --size-mb 1024 --repeat 3
+
+Writes a synthetic fp32 state dict of roughly --size-mb into --dir and
+prints the best wall time of each saver, plus the fp16 cast path.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import safetensors
+import torch
+from safetensors.torch import save_file as stock_save_file
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import safetensors_writer
+
+
+def make_state_dict(size_mb):
+    sd = {}
+    remaining = size_mb * 1024 * 1024 // 4
+    i = 0
+    while remaining > 0:
+        # Mix of large weights and small biases/norms, like a UNet.
+        numel = min(remaining, 4096 * 1024 if i % 4 else 1280)
+        sd[f"layer.{i}.weight"] = torch.randn(numel)
+        remaining -= numel
+        i += 1
+    return sd
+
+
+def best_of(repeat, fn):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=1024)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--dir", default=None)
+    args = parser.parse_args()
+
+    sd = make_state_dict(args.size_mb)
+    metadata = {"author": "bench"}
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        path = os.path.join(tmp, "model.safetensors")
+
+        def save(fn):
+            # Start from no file and flush to disk, so every case pays for
+            # allocating and writing the same blocks.
+            if os.path.exists(path):
+                os.remove(path)
+            fn()
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+        cases = [
+            ("stock save_file", lambda: stock_save_file(sd, path, metadata=metadata)),
+            ("streaming save_file", lambda: safetensors_writer.save_file(sd, path, metadata=metadata)),
+            ("stock + fp16 cast", lambda: stock_save_file({k: v.half() for k, v in sd.items()}, path, metadata=metadata)),
+            ("streaming fp16 cast", lambda: safetensors_writer.save_file(sd, path, metadata=metadata, dtype=torch.float16)),
+        ]
+
+        print(f"safetensors {safetensors.__version__}, {len(sd)} tensors, {args.size_mb} MB fp32, best of {args.repeat}")
+        for name, fn in cases:
+            seconds = best_of(args.repeat, lambda: save(fn))
+            print(f"  {name:<22} {seconds:8.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import contextlib
+import ctypes
+import json
+import os
+import struct
+import sys
+
+
+_DTYPE_NAMES = {
+    "float64": "F64",
+    "float32": "F32",
+    "float16": "F16",
+    "bfloat16": "BF16",
+    "float8_e4m3fn": "F8_E4M3",
+    "float8_e5m2": "F8_E5M2",
+    "int64": "I64",
+    "int32": "I32",
+    "int16": "I16",
+    "int8": "I8",
+    "uint8": "U8",
+    "bool": "BOOL",
+}
+
+# Rank of each dtype in the safetensors Dtype enum. The reference
+# serializer lays tensors out by descending rank, which also groups them
+# by descending element size and keeps every offset aligned.
+_DTYPE_RANK = {
+    name: rank
+    for rank, name in enumerate(("BOOL", "U8", "I8", "F8_E5M2", "F8_E4M3", "I16", "F16", "BF16", "I32", "F32", "F64", "I64"))
+}
+
+
+def _safetensors_dtype(tensor):
+    return _DTYPE_NAMES.get(str(tensor.dtype).rpartition(".")[2])
+
+
+def _cast_for_save(tensor, dtype):
+    """
+    Cast float tensors of 16 bits or wider to dtype; leave everything else,
+    including fp8 weights, untouched.
+    """
+    if dtype is None or tensor.dtype == dtype:
+        return tensor
+
+    if not tensor.is_floating_point() or tensor.element_size() < 2:
+        return tensor
+
+    return tensor.to(dtype)
+
+
+def can_write(sd):
+    """
+    Return True if every tensor in sd has a dtype this writer knows and the
+    host byte order matches the little-endian safetensors layout.
+    """
+    if sys.byteorder != "little":
+        return False
+
+    return all(_safetensors_dtype(t) is not None for t in sd.values())
+
+
+def save_file(sd, path, metadata=None, dtype=None):
+    """
+    Write sd to path in safetensors format, streaming each tensor's memory
+    straight to the file.
+
+    Unlike safetensors.torch.save_file, no serialized copy of the state
+    dict is built first.
+
+    If dtype is given, float tensors are cast to it one at a time while
+    being written.
+    """
+    header = {}
+    if metadata:
+        header["__metadata__"] = metadata
+
+    if dtype is not None:
+        cast_element_size = dtype.itemsize
+        cast_saved_dtype = _DTYPE_NAMES[str(dtype).rpartition(".")[2]]
+
+    entries = []
+    for name, tensor in sd.items():
+        if dtype is not None and tensor.is_floating_point() and tensor.element_size() >= 2:
+            element_size = cast_element_size
+            saved_dtype = cast_saved_dtype
+        else:
+            element_size = tensor.element_size()
+            saved_dtype = _safetensors_dtype(tensor)
+
+        entries.append((element_size, name, saved_dtype, tensor))
+
+    # Same order as the safetensors serializer, so every tensor starts on a
+    # multiple of its element size.
+    entries.sort(key=lambda e: (-_DTYPE_RANK[e[2]], e[1]))
+
+    layout = []
+    offset = 0
+    for element_size, name, saved_dtype, tensor in entries:
+        nbytes = tensor.numel() * element_size
+        header[name] = {
+            "dtype": saved_dtype,
+            "shape": list(tensor.shape),
+            "data_offsets": [offset, offset + nbytes],
+        }
+        layout.append((tensor, nbytes))
+        offset += nbytes
+
+    header_bytes = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    header_bytes += b" " * (-len(header_bytes) % 8)
+
+    # Write next to the target and rename at the end, so a failed save never
+    # leaves a truncated file or clobbers an existing checkpoint.
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(struct.pack("<Q", len(header_bytes)))
+            f.write(header_bytes)
+
+            for tensor, nbytes in layout:
+                if nbytes == 0:
+                    continue
+
+                src = _cast_for_save(tensor.detach(), dtype).contiguous().cpu()
+                # Hand the tensor's own memory to write() without a bytes copy.
+                f.write((ctypes.c_ubyte * nbytes).from_address(src.data_ptr()))
+
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+
+
+def _stock_saver_streams():
+    """
+    Return True if the installed safetensors.torch.save_file already writes
+    straight from tensor memory, which newer releases do via
+    _flatten_as_ptr. Older releases build a bytes copy of every tensor
+    first, and save_file is faster than them.
+    """
+    try:
+        import safetensors.torch
+    except ImportError:
+        return False
+
+    return hasattr(safetensors.torch, "_flatten_as_ptr")
+
+
+@contextlib.contextmanager
+def streaming_save_torch_file(save_dtype="preserve"):
+    """
+    Temporarily route comfy.utils.save_torch_file through save_file.
+
+    save_dtype is "preserve" or the name of a torch float dtype ("float16",
+    "bfloat16") to downcast float weights to. State dicts this writer cannot
+    handle are passed to the original ComfyUI implementation, cast first
+    when a save_dtype is set. Without a cast, the original is also used when
+    the installed safetensors already streams from tensor memory, since it
+    is at least as fast as save_file there.
+    """
+    import comfy.utils
+
+    original = comfy.utils.save_torch_file
+
+    dtype = None
+    if save_dtype != "preserve":
+        import torch
+
+        dtype = getattr(torch, save_dtype)
+
+    use_original = dtype is None and _stock_saver_streams()
+
+    def save_torch_file(sd, ckpt, metadata=None):
+        if use_original or not can_write(sd):
+            if dtype is not None:
+                sd = {k: _cast_for_save(v, dtype) for k, v in sd.items()}
+            return original(sd, ckpt, metadata=metadata)
+
+        save_file(sd, ckpt, metadata=metadata, dtype=dtype)
+
+    comfy.utils.save_torch_file = save_torch_file
+    try:
+        yield
+    finally:
+        comfy.utils.save_torch_file = original
@@ -0,0 +1,553 @@
+import functools
+import json
+import os
+import re
+
+import folder_paths
+
+from .safetensors_writer import streaming_save_torch_file
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _dumps(obj, indent=False):
+    """
+    Serialize obj to a JSON string, using orjson when it is installed.
+
+    Falls back to the stdlib for objects orjson refuses (non-str keys,
+    integers wider than 64 bits, ...). Values neither encoder understands
+    are stored via str().
+
+    orjson writes NaN and Infinity as null. Any null in its output may be
+    one of those, so such objects are re-encoded with the stdlib, which
+    keeps them as written.
+    """
+    if orjson is not None:
+        try:
+            out = orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+        except TypeError:
+            pass
+        else:
+            if b"null" not in out:
+                return out.decode("utf-8")
+
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2, default=str)
+
+    # Same compact form orjson writes, so header bytes do not depend on
+    # which encoder is installed.
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def _extra_pnginfo_value(v):
+    """
+    Encode a non-str EXTRA_PNGINFO value for the header.
+
+    Values that cannot be JSON-encoded at all (non-str dict keys, circular
+    references) are stored as str(v) rather than failing the save.
+    """
+    try:
+        return _dumps(v)
+    except Exception:
+        return str(v)
+
+
+# Encodes user-typed metadata values. The stdlib keeps big integers, NaN
+# and Infinity from metadata_json exactly as written.
+_json_dumps_compact = functools.partial(json.dumps, ensure_ascii=False, separators=(",", ":"))
+
+
+# orjson parses integers outside the int64/uint64 range as lossy floats.
+# Those need at least 19 digits (below -2**63), so leave any input with a
+# 19+ digit run to the stdlib.
+_LONG_DIGITS = re.compile(r"[0-9]{19}")
+
+
+def _loads(s):
+    """
+    Parse a JSON string, using orjson when it is installed and the input
+    cannot lose precision in it.
+
+    Falls back to the stdlib for input orjson rejects (NaN, Infinity,
+    out-of-range floats).
+    """
+    if orjson is not None and _LONG_DIGITS.search(s) is None:
+        try:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError:
+            pass
+
+    return json.loads(s)
+
+
+def _path_exists(path):
+    """
+    Like os.path.exists, but only a missing file counts as absent.
+
+    Other errors (permissions, I/O) propagate instead of being treated as
+    a free name that would then be written over.
+    """
+    try:
+        os.stat(path)
+    except FileNotFoundError:
+        return False
+
+    return True
+
+
+@functools.lru_cache(maxsize=64)
+def _resolve_save_dir_cached(filename_prefix, output_dir):
+    full_dir, base, counter, _subfolder, _filename = folder_paths.get_save_image_path(
+        filename_prefix,
+        output_dir
+    )
+    return full_dir, base, counter
+
+
+def _resolve_save_dir(filename_prefix, output_dir):
+    """
+    Resolve (full_dir, base, counter_hint) for a filename prefix under output_dir.
+
+    Results are memoized per (prefix, output_dir). Prefixes containing
+    %...% tokens (dates, sizes) are resolved fresh every time because their
+    expansion depends on when and what is being saved.
+
+    counter_hint is ComfyUI's next free counter at resolution time. It may be
+    stale when served from the cache, so callers must treat it as a guess.
+    """
+    if "%" in filename_prefix:
+        full_dir, base, counter, _subfolder, _filename = folder_paths.get_save_image_path(
+            filename_prefix,
+            output_dir
+        )
+        return full_dir, base, counter
+
+    return _resolve_save_dir_cached(filename_prefix, output_dir)
+
+
+# Next suffix to try per (full_dir, base), recorded after each successful
+# smart_counter save so a stale counter_hint from the resolve cache does
+# not force a rescan. None means the unsuffixed name was free last time,
+# so the directory has changed and must be scanned again.
+_next_suffix_hints = {}
+
+# Output directories already created or confirmed this session.
+_known_dirs = set()
+
+
+class SaveCheckpointWithMetadata:
+    """
+    Save a checkpoint with explicit control over safetensors metadata.
+
+    Modes:
+      - replace: write ONLY metadata_json. Ignore prompt_override and EXTRA_PNGINFO.
+      - merge_minimal: base = prompt (override or hidden PROMPT) plus EXTRA_PNGINFO
+        if include_extra_pnginfo=True, then overlay metadata_json.
+
+    File naming modes:
+      - smart_counter: if unsuffixed file does not exist, use it; otherwise continue
+        from next free index based on existing files.
+      - no_counter_overwrite: always use unsuffixed file name; overwrite if it exists.
+    """
+
+    SEARCH_ALIASES = ["save checkpoint metadata", "checkpoint metadata", "safetensors metadata"]
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "model": ("MODEL", {
+                    "tooltip": "MODEL to serialize into a .safetensors checkpoint. Wire your merged/trained model here."
+                }),
+                "filename_prefix": ("STRING", {
+                    "default": "checkpoints/CustomMeta",
+                    "tooltip": "Subfolder/prefix under output directory. Example: checkpoints/MyModel."
+                }),
+                "filename_mode": (["smart_counter", "no_counter_overwrite"], {
+                    "default": "smart_counter",
+                    "tooltip": "smart_counter: first save uses prefix.safetensors if free, later saves use prefix_00001_.safetensors. no_counter_overwrite: always write to prefix.safetensors and overwrite if it exists."
+                }),
+                "metadata_json": ("STRING", {
+                    "default": "{}",
+                    "multiline": True,
+                    "tooltip": "JSON object of header keys to write. Values must be strings; non-strings are JSON-encoded for you. Example: {\"author\":\"Alex\",\"training\":{\"epochs\":80}}"
+                }),
+                "metadata_mode": (["replace", "merge_minimal"], {
+                    "default": "replace",
+                    "tooltip": "replace: write only metadata_json. merge_minimal: start with prompt and optional EXTRA_PNGINFO, then apply metadata_json."
+                }),
+                "include_extra_pnginfo": ("BOOLEAN", {
+                    "default": True,
+                    "tooltip": "Merge mode only. When ON, copy keys from hidden EXTRA_PNGINFO into the header before applying metadata_json."
+                }),
+                "prompt_override": ("STRING", {
+                    "default": "",
+                    "multiline": True,
+                    "tooltip": "Optional override for the hidden PROMPT. Ignored in replace mode. In merge_minimal mode, becomes the base prompt unless metadata_json also contains prompt."
+                }),
+            },
+            "optional": {
+                "save_dtype": (["preserve", "float16", "bfloat16"], {
+                    "default": "preserve",
+                    "tooltip": "preserve: keep weight dtypes as-is. float16/bfloat16: cast float weights before writing, halving the size of fp32 checkpoints. fp8 and integer tensors are never changed."
+                }),
+                "clip": ("CLIP", {
+                    "tooltip": "Optional CLIP to embed into the saved checkpoint."
+                }),
+                "vae": ("VAE", {
+                    "tooltip": "Optional VAE to embed into the saved checkpoint."
+                }),
+                "clip_vision": ("CLIP_VISION", {
+                    "tooltip": "Optional CLIP_VISION to embed into the saved checkpoint."
+                }),
+            },
+            "hidden": {
+                "prompt": "PROMPT",
+                "extra_pnginfo": "EXTRA_PNGINFO",
+            },
+        }
+
+    RETURN_TYPES = ("STRING", "STRING", "STRING", "STRING")
+    RETURN_NAMES = ("ckpt_path", "saved_metadata", "saved_prompt", "saved_extra_pnginfo")
+    FUNCTION = "save"
+    OUTPUT_NODE = True
+    CATEGORY = "advanced/model_merging"
+
+    def _coerce_metadata(self, dct):
+        if dct is None:
+            return {}
+
+        if not isinstance(dct, dict):
+            raise ValueError("metadata_json must be a JSON object.")
+
+        return {str(k): (v if type(v) is str else _json_dumps_compact(v)) for k, v in dct.items()}
+
+    def _serialize_prompt(self, prompt_obj_or_str):
+        if prompt_obj_or_str is None:
+            return None
+
+        if isinstance(prompt_obj_or_str, str):
+            s = prompt_obj_or_str.strip()
+            return s if s else None
+
+        return _dumps(prompt_obj_or_str)
+
+    def _build_unsuffixed_path(self, full_dir, base):
+        return os.path.join(full_dir, f"{base}.safetensors")
+
+    def _build_suffixed_path(self, full_dir, base, n):
+        return os.path.join(full_dir, f"{base}_{n:05}_.safetensors")
+
+    def _next_suffix_from_dir(self, full_dir, base):
+        """
+        Inspect existing files and return the next numeric suffix.
+        If no suffixed files exist, return 1.
+
+        Looks for:
+          base_00001_.safetensors
+        """
+        match = re.compile(re.escape(base) + r"_([0-9]+)_\.safetensors\Z").match
+        max_n = 0
+
+        try:
+            with os.scandir(full_dir) as it:
+                for entry in it:
+                    m = match(entry.name)
+                    if m is None:
+                        continue
+
+                    n = int(m.group(1))
+                    if n > max_n:
+                        max_n = n
+
+        except FileNotFoundError:
+            max_n = 0
+
+        return max_n + 1
+
+    def _choose_save_path(self, full_dir, base, filename_mode, counter_hint=1):
+        """
+        Filename policy:
+          - smart_counter:
+              If base.safetensors does not exist, use it.
+              Else try the suffix remembered from the last save here, or
+              counter_hint on the first one. If that is taken, or the
+              unsuffixed name was used last time, compute the next suffix
+              from existing files.
+          - no_counter_overwrite:
+              Always use base.safetensors.
+
+        Returns (save_path, suffix_n); suffix_n is None for the unsuffixed name.
+        """
+        unsuffixed = self._build_unsuffixed_path(full_dir, base)
+
+        if filename_mode == "no_counter_overwrite":
+            return unsuffixed, None
+
+        if not _path_exists(unsuffixed):
+            return unsuffixed, None
+
+        suffix_n = _next_suffix_hints.get((full_dir, base), counter_hint)
+        save_path = self._build_suffixed_path(full_dir, base, suffix_n) if suffix_n is not None else None
+        if save_path is None or _path_exists(save_path):
+            suffix_n = self._next_suffix_from_dir(full_dir, base)
+            save_path = self._build_suffixed_path(full_dir, base, suffix_n)
+
+            # The scan is case-sensitive and another process may have saved
+            # since, so still probe until a free name is found.
+            while _path_exists(save_path):
+                suffix_n += 1
+                save_path = self._build_suffixed_path(full_dir, base, suffix_n)
+
+        return save_path, suffix_n
+
+    def _save_file(self, save_path, model, clip, vae, clip_vision, final_meta, save_dtype="preserve"):
+        """
+        Base checkpoint save implementation.
+
+        This is used by SaveCheckpointWithMetadata and can be overridden by
+        subclasses that need different save behavior.
+        """
+        import comfy.sd
+
+        with streaming_save_torch_file(save_dtype):
+            comfy.sd.save_checkpoint(
+                save_path,
+                model,
+                clip=clip,
+                vae=vae,
+                clip_vision=clip_vision,
+                metadata=final_meta,
+                extra_keys={}
+            )
+
+    def save(
+        self,
+        model,
+        filename_prefix,
+        filename_mode,
+        metadata_json,
+        metadata_mode,
+        include_extra_pnginfo,
+        prompt_override,
+        save_dtype="preserve",
+        clip=None,
+        vae=None,
+        clip_vision=None,
+        prompt=None,
+        extra_pnginfo=None,
+    ):
+        stripped = metadata_json.strip()
+        if not stripped or stripped == "{}":
+            user_meta_obj = {}
+        elif stripped[0] != "{":
+            raise ValueError("metadata_json must be a JSON object.")
+        else:
+            try:
+                # metadata_json is small and user-typed; the stdlib keeps
+                # big integers, NaN and Infinity exactly as written.
+                user_meta_obj = json.loads(stripped)
+            except Exception as e:
+                raise ValueError(f"Invalid metadata_json: {e}")
+
+        # Coercion only touches top-level keys; each nested value is encoded
+        # once by _json_dumps_compact. An object_hook would see nested dicts first and
+        # cannot tell them from the root, so keep this as a separate step.
+        user_meta = self._coerce_metadata(user_meta_obj)
+
+        base_metadata = {}
+        saved_extra_subset = {}
+
+        # The prompt is only used as merge base, so replace mode never pays
+        # for serializing the whole prompt graph.
+        if metadata_mode == "merge_minimal":
+            if prompt_override and prompt_override.strip():
+                try:
+                    parsed_prompt_override = _loads(prompt_override)
+                    effective_prompt = self._serialize_prompt(parsed_prompt_override)
+                except Exception:
+                    effective_prompt = self._serialize_prompt(prompt_override)
+            else:
+                effective_prompt = self._serialize_prompt(prompt)
+
+            if effective_prompt is not None:
+                base_metadata["prompt"] = effective_prompt
+
+            if include_extra_pnginfo and isinstance(extra_pnginfo, dict):
+                saved_extra_subset = {
+                    str(k): (v if type(v) is str else _extra_pnginfo_value(v))
+                    for k, v in extra_pnginfo.items()
+                }
+                base_metadata.update(saved_extra_subset)
+
+        final_meta = base_metadata | user_meta
+
+        full_dir, base, counter_hint = _resolve_save_dir(filename_prefix, folder_paths.get_output_directory())
+        if full_dir not in _known_dirs:
+            os.makedirs(full_dir, exist_ok=True)
+            _known_dirs.add(full_dir)
+
+        save_kwargs = dict(
+            model=model,
+            clip=clip,
+            vae=vae,
+            clip_vision=clip_vision,
+            final_meta=final_meta,
+            save_dtype=save_dtype,
+        )
+
+        save_path, suffix_n = self._choose_save_path(full_dir, base, filename_mode, counter_hint)
+
+        try:
+            self._save_file(save_path=save_path, **save_kwargs)
+        except Exception:
+            # The folder may have been removed after it was cached in
+            # _known_dirs. Savers report that differently (safetensors raises
+            # SafetensorError, not FileNotFoundError), so check the folder
+            # itself: recreate it and retry once, otherwise re-raise.
+            if os.path.isdir(full_dir):
+                raise
+
+            _known_dirs.discard(full_dir)
+            os.makedirs(full_dir, exist_ok=True)
+            _known_dirs.add(full_dir)
+
+            save_path, suffix_n = self._choose_save_path(full_dir, base, filename_mode, counter_hint)
+            self._save_file(save_path=save_path, **save_kwargs)
+
+        if filename_mode == "smart_counter":
+            _next_suffix_hints[(full_dir, base)] = None if suffix_n is None else suffix_n + 1
+
+        # Empty dicts are common (replace mode, no EXTRA_PNGINFO); skip the
+        # encoder for them. Outputs must stay real str for downstream nodes.
+        saved_metadata_str = _dumps(final_meta, indent=True) if final_meta else "{}"
+        saved_prompt_str = final_meta.get("prompt", "") or ""
+        saved_extra_str = _dumps(saved_extra_subset, indent=True) if saved_extra_subset else "{}"
+
+        return (save_path, saved_metadata_str, saved_prompt_str, saved_extra_str)
+
+
+class SaveDiffusionModelWithMetadata(SaveCheckpointWithMetadata):
+    """
+    Save only the MODEL/diffusion model with explicit safetensors metadata control.
+
+    This shares metadata, filename replacement, and counter behavior with
+    SaveCheckpointWithMetadata, but exposes no CLIP/VAE inputs.
+    """
+
+    SEARCH_ALIASES = ["export model", "save diffusion model", "model save metadata"]
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "model": ("MODEL", {
+                    "tooltip": "MODEL to serialize into a .safetensors diffusion model file."
+                }),
+                "filename_prefix": ("STRING", {
+                    "default": "diffusion_models/CustomMeta",
+                    "tooltip": "Subfolder/prefix under output directory. Example: diffusion_models/MyModel."
+                }),
+                "filename_mode": (["smart_counter", "no_counter_overwrite"], {
+                    "default": "smart_counter",
+                    "tooltip": "smart_counter: first save uses prefix.safetensors if free, later saves use prefix_00001_.safetensors. no_counter_overwrite: overwrite prefix.safetensors."
+                }),
+                "metadata_json": ("STRING", {
+                    "default": "{}",
+                    "multiline": True,
+                    "tooltip": "JSON object of safetensors header keys to write."
+                }),
+                "metadata_mode": (["replace", "merge_minimal"], {
+                    "default": "replace",
+                    "tooltip": "replace: write only metadata_json. merge_minimal: include prompt/extra_pnginfo, then apply metadata_json."
+                }),
+                "include_extra_pnginfo": ("BOOLEAN", {
+                    "default": True,
+                    "tooltip": "Merge mode only. Copy hidden EXTRA_PNGINFO keys before applying metadata_json."
+                }),
+                "prompt_override": ("STRING", {
+                    "default": "",
+                    "multiline": True,
+                    "tooltip": "Optional replacement for hidden PROMPT in merge_minimal mode."
+                }),
+            },
+            "optional": {
+                "save_dtype": (["preserve", "float16", "bfloat16"], {
+                    "default": "preserve",
+                    "tooltip": "preserve: keep weight dtypes as-is. float16/bfloat16: cast float weights before writing."
+                }),
+            },
+            "hidden": {
+                "prompt": "PROMPT",
+                "extra_pnginfo": "EXTRA_PNGINFO",
+            },
+        }
+
+    RETURN_TYPES = ("STRING", "STRING", "STRING", "STRING")
+    RETURN_NAMES = ("model_path", "saved_metadata", "saved_prompt", "saved_extra_pnginfo")
+    FUNCTION = "save"
+    OUTPUT_NODE = True
+    CATEGORY = "advanced/model_merging"
+
+    def _save_file(self, save_path, model, clip, vae, clip_vision, final_meta, save_dtype="preserve"):
+        """
+        Diffusion-model-only save.
+
+        This intentionally ignores CLIP/VAE/CLIP_VISION inputs because this node
+        only exposes and saves the MODEL object.
+        """
+        import comfy.sd
+
+        with streaming_save_torch_file(save_dtype):
+            comfy.sd.save_checkpoint(
+                save_path,
+                model,
+                clip=None,
+                vae=None,
+                clip_vision=None,
+                metadata=final_meta,
+                extra_keys={}
+            )
+
+    def save(
+        self,
+        model,
+        filename_prefix,
+        filename_mode,
+        metadata_json,
+        metadata_mode,
+        include_extra_pnginfo,
+        prompt_override,
+        save_dtype="preserve",
+        prompt=None,
+        extra_pnginfo=None,
+    ):
+        return super().save(
+            model=model,
+            filename_prefix=filename_prefix,
+            filename_mode=filename_mode,
+            metadata_json=metadata_json,
+            metadata_mode=metadata_mode,
+            include_extra_pnginfo=include_extra_pnginfo,
+            prompt_override=prompt_override,
+            save_dtype=save_dtype,
+            clip=None,
+            vae=None,
+            clip_vision=None,
+            prompt=prompt,
+            extra_pnginfo=extra_pnginfo,
+        )
+
+
+NODE_CLASS_MAPPINGS = {
+    "SaveCheckpointWithMetadata": SaveCheckpointWithMetadata,
+    "SaveDiffusionModelWithMetadata": SaveDiffusionModelWithMetadata,
+}
+
+NODE_DISPLAY_NAME_MAPPINGS = {
+    "SaveCheckpointWithMetadata": "Save Checkpoint with Metadata",
+    "SaveDiffusionModelWithMetadata": "Save Diffusion Model with Metadata",
+}
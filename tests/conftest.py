@@ -0,0 +1,38 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+import folder_paths
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "save_checkpoint_with_metadata"
+
+
+def _load_package():
+    if PACKAGE not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            PACKAGE,
+            os.path.join(ROOT, "__init__.py"),
+            submodule_search_locations=[ROOT],
+        )
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[PACKAGE] = module
+        spec.loader.exec_module(module)
+
+    return sys.modules[f"{PACKAGE}.save_checkpoint_node"]
+
+
+@pytest.fixture
+def node_module(tmp_path, monkeypatch):
+    """
+    save_checkpoint_node with its session caches cleared and the ComfyUI
+    output directory pointed at a temporary folder.
+    """
+    module = _load_package()
+    module._next_suffix_hints.clear()
+    module._known_dirs.clear()
+    module._resolve_save_dir_cached.cache_clear()
+    monkeypatch.setattr(folder_paths, "output_directory", str(tmp_path / "output"))
+    return module
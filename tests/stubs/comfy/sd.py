@@ -0,0 +1,12 @@
+"""
+Minimal stand-in for comfy.sd. The tests pass a plain state dict as MODEL;
+it is saved through comfy.utils.save_torch_file like the real function.
+"""
+
+import comfy.utils
+
+
+def save_checkpoint(output_path, model, clip=None, vae=None, clip_vision=None, metadata=None, extra_keys={}):
+    sd = dict(model)
+    sd.update(extra_keys)
+    comfy.utils.save_torch_file(sd, output_path, metadata=metadata)
@@ -0,0 +1,10 @@
+"""Minimal stand-in for comfy.utils, matching its save_torch_file."""
+
+import safetensors.torch
+
+
+def save_torch_file(sd, ckpt, metadata=None):
+    if metadata is not None:
+        safetensors.torch.save_file(sd, ckpt, metadata=metadata)
+    else:
+        safetensors.torch.save_file(sd, ckpt)
@@ -0,0 +1,34 @@
+"""Minimal stand-in for ComfyUI's folder_paths module, used by the tests."""
+
+import os
+
+output_directory = os.path.join(os.getcwd(), "output")
+
+
+def get_output_directory():
+    return output_directory
+
+
+def get_save_image_path(filename_prefix, output_dir, image_width=0, image_height=0):
+    def map_filename(filename):
+        prefix_len = len(os.path.basename(filename_prefix))
+        prefix = filename[:prefix_len + 1]
+        try:
+            digits = int(filename[prefix_len + 1:].split("_")[0])
+        except ValueError:
+            digits = 0
+        return digits, prefix
+
+    subfolder = os.path.dirname(os.path.normpath(filename_prefix))
+    filename = os.path.basename(os.path.normpath(filename_prefix))
+    full_output_folder = os.path.join(output_dir, subfolder)
+
+    try:
+        counter = max(
+            d for d, p in map(map_filename, os.listdir(full_output_folder))
+            if os.path.normcase(p[:-1]) == os.path.normcase(filename) and p[-1] == "_"
+        ) + 1
+    except (ValueError, FileNotFoundError):
+        counter = 1
+
+    return full_output_folder, filename, counter, subfolder, filename_prefix
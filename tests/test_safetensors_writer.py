@@ -0,0 +1,186 @@
+"""Round-trip tests for safetensors_writer."""
+
+import json
+import os
+import sys
+import types
+
+import pytest
+
+torch = pytest.importorskip("torch")
+safetensors = pytest.importorskip("safetensors")
+
+from safetensors import safe_open
+from safetensors.torch import load_file
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import safetensors_writer
+
+
+def _raw(t):
+    return t.contiguous().reshape(-1).view(torch.uint8)
+
+
+def _mixed_state_dict():
+    return {
+        # Odd-numel 2-byte tensors written before wider ones in dict order.
+        "logit_scale": torch.tensor(4.25, dtype=torch.float16),
+        "odd_f16": torch.arange(3, dtype=torch.float16),
+        "odd_bf16": torch.arange(5, dtype=torch.bfloat16),
+        "weight": torch.randn(4, 5),
+        "weight_t": torch.randn(6, 4).t(),
+        "double": torch.randn(3, dtype=torch.float64),
+        "ids": torch.arange(7),
+        "small_ints": torch.arange(-3, 4, dtype=torch.int8),
+        "bytes": torch.arange(9, dtype=torch.uint8),
+        "mask": torch.tensor([True, False, True]),
+        "fp8": torch.randn(5).to(torch.float8_e4m3fn),
+        "scalar_i32": torch.tensor(7, dtype=torch.int32),
+        "empty": torch.empty(0, 3),
+        "empty_f16": torch.empty(0, dtype=torch.float16),
+    }
+
+
+def test_round_trip_mixed_dtypes(tmp_path):
+    sd = _mixed_state_dict()
+    path = str(tmp_path / "model.safetensors")
+
+    safetensors_writer.save_file(sd, path, metadata={"author": "Alex", "training": '{"epochs":80}'})
+
+    loaded = load_file(path)
+    assert loaded.keys() == sd.keys()
+    for name, tensor in sd.items():
+        assert loaded[name].dtype == tensor.dtype, name
+        assert loaded[name].shape == tensor.shape, name
+        assert torch.equal(_raw(loaded[name]), _raw(tensor)), name
+
+    with safe_open(path, framework="pt") as f:
+        assert f.metadata() == {"author": "Alex", "training": '{"epochs":80}'}
+
+
+def test_offsets_are_aligned(tmp_path):
+    path = str(tmp_path / "model.safetensors")
+    safetensors_writer.save_file(_mixed_state_dict(), path)
+
+    with open(path, "rb") as f:
+        header_len = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(header_len))
+
+    assert (8 + header_len) % 8 == 0
+    sizes = {"F64": 8, "I64": 8, "F32": 4, "I32": 4, "F16": 2, "BF16": 2}
+    for name, info in header.items():
+        size = sizes.get(info["dtype"], 1)
+        assert info["data_offsets"][0] % size == 0, name
+
+
+def test_matches_stock_serializer_without_metadata(tmp_path):
+    from safetensors.torch import save_file as stock_save_file
+
+    sd = _mixed_state_dict()
+    ours = str(tmp_path / "ours.safetensors")
+    stock = str(tmp_path / "stock.safetensors")
+
+    safetensors_writer.save_file(sd, ours)
+    stock_save_file({k: v.contiguous() for k, v in sd.items()}, stock)
+
+    with open(ours, "rb") as a, open(stock, "rb") as b:
+        ours_bytes = a.read()
+        stock_bytes = b.read()
+
+    ours_len = int.from_bytes(ours_bytes[:8], "little")
+    stock_len = int.from_bytes(stock_bytes[:8], "little")
+    assert ours_bytes[8 + ours_len:] == stock_bytes[8 + stock_len:]
+
+
+@pytest.mark.parametrize("dtype", [torch.float16, torch.bfloat16])
+def test_cast_path(tmp_path, dtype):
+    sd = _mixed_state_dict()
+    path = str(tmp_path / "model.safetensors")
+
+    safetensors_writer.save_file(sd, path, metadata={"k": "v"}, dtype=dtype)
+
+    loaded = load_file(path)
+    for name, tensor in sd.items():
+        if tensor.is_floating_point() and tensor.element_size() >= 2:
+            assert loaded[name].dtype == dtype, name
+            assert torch.equal(loaded[name], tensor.to(dtype)), name
+        else:
+            assert loaded[name].dtype == tensor.dtype, name
+            assert torch.equal(_raw(loaded[name]), _raw(tensor)), name
+
+
+def test_copy_error_is_not_masked(tmp_path):
+    sd = {"ok": torch.randn(3), "bad": torch.empty(3, device="meta")}
+
+    with pytest.raises(NotImplementedError):
+        safetensors_writer.save_file(sd, str(tmp_path / "model.safetensors"))
+
+
+def test_failed_save_keeps_existing_file(tmp_path):
+    path = tmp_path / "model.safetensors"
+    path.write_bytes(b"x" * 1000)
+    sd = {"ok": torch.randn(300), "bad": torch.empty(3, device="meta")}
+
+    with pytest.raises(NotImplementedError):
+        safetensors_writer.save_file(sd, str(path), dtype=torch.float16)
+
+    assert path.read_bytes() == b"x" * 1000
+    assert os.listdir(tmp_path) == ["model.safetensors"]
+
+
+def _fake_comfy_utils(monkeypatch, calls):
+    comfy = types.ModuleType("comfy")
+    utils = types.ModuleType("comfy.utils")
+
+    def save_torch_file(sd, ckpt, metadata=None):
+        calls.append((sd, ckpt, metadata))
+
+    utils.save_torch_file = save_torch_file
+    comfy.utils = utils
+    monkeypatch.setitem(sys.modules, "comfy", comfy)
+    monkeypatch.setitem(sys.modules, "comfy.utils", utils)
+    return utils
+
+
+def test_patch_routes_through_writer_and_restores(tmp_path, monkeypatch):
+    calls = []
+    utils = _fake_comfy_utils(monkeypatch, calls)
+    original = utils.save_torch_file
+    path = str(tmp_path / "model.safetensors")
+
+    with safetensors_writer.streaming_save_torch_file("float16"):
+        utils.save_torch_file({"w": torch.randn(2, 2)}, path, metadata={"k": "v"})
+
+    assert utils.save_torch_file is original
+    assert calls == []
+    assert load_file(path)["w"].dtype == torch.float16
+
+
+def test_patch_falls_back_for_unsupported_dtype(tmp_path, monkeypatch):
+    calls = []
+    utils = _fake_comfy_utils(monkeypatch, calls)
+    sd = {"w": torch.randn(2), "c": torch.randn(2, dtype=torch.complex64)}
+
+    with safetensors_writer.streaming_save_torch_file("bfloat16"):
+        utils.save_torch_file(sd, "unused.safetensors", metadata={"k": "v"})
+
+    assert len(calls) == 1
+    fallback_sd, _ckpt, metadata = calls[0]
+    assert fallback_sd["w"].dtype == torch.bfloat16
+    assert fallback_sd["c"].dtype == torch.complex64
+    assert metadata == {"k": "v"}
+
+
+@pytest.mark.parametrize("streams, expect_original", [(True, True), (False, False)])
+def test_patch_preserve_uses_stock_saver_when_it_streams(tmp_path, monkeypatch, streams, expect_original):
+    calls = []
+    utils = _fake_comfy_utils(monkeypatch, calls)
+    monkeypatch.setattr(safetensors_writer, "_stock_saver_streams", lambda: streams)
+    path = str(tmp_path / "model.safetensors")
+
+    with safetensors_writer.streaming_save_torch_file("preserve"):
+        utils.save_torch_file({"w": torch.randn(2)}, path, metadata={"k": "v"})
+
+    assert (len(calls) == 1) == expect_original
+    assert os.path.exists(path) != expect_original
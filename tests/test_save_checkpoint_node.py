@@ -0,0 +1,225 @@
+"""Behavior tests for the save nodes, run against stubbed ComfyUI modules."""
+
+import os
+import shutil
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("safetensors")
+
+from safetensors import safe_open
+
+
+MODEL = {"w": torch.ones(2, 2)}
+
+
+def _save(node_module, prefix="checkpoints/P", **kwargs):
+    kwargs = {
+        "model": MODEL,
+        "filename_prefix": prefix,
+        "filename_mode": "smart_counter",
+        "metadata_json": "{}",
+        "metadata_mode": "replace",
+        "include_extra_pnginfo": True,
+        "prompt_override": "",
+        **kwargs,
+    }
+    return node_module.SaveCheckpointWithMetadata().save(**kwargs)
+
+
+def test_save_writes_metadata(node_module):
+    path, saved_metadata, _prompt, _extra = _save(node_module, metadata_json='{"author":"Alex","training":{"epochs":80}}')
+
+    assert os.path.basename(path) == "P.safetensors"
+    with safe_open(path, framework="pt") as f:
+        assert f.metadata() == {"author": "Alex", "training": '{"epochs":80}'}
+        assert torch.equal(f.get_tensor("w"), MODEL["w"])
+    assert '"author": "Alex"' in saved_metadata
+
+
+@pytest.mark.parametrize("prompt_override, expected", [
+    ('{"seed": -9999999999999999999}', '{"seed":-9999999999999999999}'),
+    ('{"seed": 123456789012345678901234567890}', '{"seed":123456789012345678901234567890}'),
+    ('{"seed": 18446744073709551615}', '{"seed":18446744073709551615}'),
+    ('{"cfg": NaN, "x": Infinity}', '{"cfg":NaN,"x":Infinity}'),
+    ('{"cfg": 7.5, "x": null}', '{"cfg":7.5,"x":null}'),
+])
+def test_prompt_override_numbers_are_exact(node_module, prompt_override, expected):
+    _path, _meta, saved_prompt, _extra = _save(node_module, metadata_mode="merge_minimal", prompt_override=prompt_override)
+
+    assert saved_prompt == expected
+
+
+def test_metadata_and_extra_pnginfo_numbers_are_exact(node_module):
+    path, _meta, _prompt, _extra = _save(
+        node_module,
+        metadata_mode="merge_minimal",
+        metadata_json='{"big": 123456789012345678901234567890, "nan": NaN, "nested": {"inf": -Infinity}}',
+        extra_pnginfo={"workflow": {"cfg": float("nan"), "seed": -(2 ** 64)}},
+    )
+
+    with safe_open(path, framework="pt") as f:
+        metadata = f.metadata()
+
+    assert metadata["big"] == "123456789012345678901234567890"
+    assert metadata["nan"] == "NaN"
+    assert metadata["nested"] == '{"inf":-Infinity}'
+    assert metadata["workflow"] == '{"cfg":NaN,"seed":-18446744073709551616}'
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_dumps_is_identical_with_and_without_orjson(node_module, monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(node_module, "orjson", None)
+    elif node_module.orjson is None:
+        pytest.skip("orjson not installed")
+
+    obj = {"training": {"epochs": 80, "lr": [0.0001, "x"], "note": "ü"}}
+    assert node_module._dumps(obj) == '{"training":{"epochs":80,"lr":[0.0001,"x"],"note":"ü"}}'
+
+
+def test_smart_counter_probes_past_names_the_scan_misses(node_module, monkeypatch):
+    first, *_ = _save(node_module)
+    output_dir = os.path.dirname(first)
+    for n in (1, 2):
+        open(os.path.join(output_dir, f"P_{n:05}_.safetensors"), "wb").close()
+
+    # Simulate a scan that misses existing files, e.g. a different case on a
+    # case-insensitive filesystem or a save by another process.
+    monkeypatch.setattr(node_module.SaveCheckpointWithMetadata, "_next_suffix_from_dir", lambda self, full_dir, base: 1)
+    node_module._next_suffix_hints.clear()
+
+    path, *_ = _save(node_module)
+
+    assert os.path.basename(path) == "P_00003_.safetensors"
+
+
+def test_path_builders_can_be_overridden(node_module):
+    class Node(node_module.SaveCheckpointWithMetadata):
+        def _build_unsuffixed_path(self, full_dir, base):
+            return os.path.join(full_dir, f"{base}-final.safetensors")
+
+        def _build_suffixed_path(self, full_dir, base, n):
+            return os.path.join(full_dir, f"{base}-v{n}.safetensors")
+
+    def save():
+        return Node().save(MODEL, "checkpoints/P", "smart_counter", "{}", "replace", True, "")[0]
+
+    assert os.path.basename(save()) == "P-final.safetensors"
+    assert os.path.basename(save()) == "P-v1.safetensors"
+
+
+@pytest.mark.parametrize("save_dtype", ["preserve", "float16"])
+def test_save_recreates_a_deleted_output_folder(node_module, save_dtype):
+    first, *_ = _save(node_module, save_dtype=save_dtype)
+    shutil.rmtree(os.path.dirname(first))
+
+    path, *_ = _save(node_module, save_dtype=save_dtype)
+
+    assert path == first
+    assert os.path.isfile(path)
+
+
+def test_save_errors_are_not_retried_when_the_folder_exists(node_module, monkeypatch):
+    calls = []
+
+    def fail(self, save_path, **kwargs):
+        calls.append(save_path)
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(node_module.SaveCheckpointWithMetadata, "_save_file", fail)
+
+    with pytest.raises(RuntimeError, match="disk full"):
+        _save(node_module)
+    assert len(calls) == 1
+
+
+def _names(paths):
+    return [os.path.basename(p) for p in paths]
+
+
+def test_smart_counter_sequence(node_module):
+    paths = [_save(node_module)[0] for _ in range(4)]
+
+    assert _names(paths) == [
+        "P.safetensors",
+        "P_00001_.safetensors",
+        "P_00002_.safetensors",
+        "P_00003_.safetensors",
+    ]
+
+
+def test_no_counter_overwrite_reuses_the_unsuffixed_name(node_module):
+    paths = [_save(node_module, filename_mode="no_counter_overwrite")[0] for _ in range(2)]
+
+    assert _names(paths) == ["P.safetensors", "P.safetensors"]
+
+
+def test_stale_counter_hint_falls_back_to_a_scan(node_module):
+    first, *_ = _save(node_module)
+    output_dir = os.path.dirname(first)
+
+    # Another process saved after the resolve cache recorded counter 1.
+    for n in (1, 2, 3):
+        open(os.path.join(output_dir, f"P_{n:05}_.safetensors"), "wb").close()
+    node_module._next_suffix_hints.clear()
+
+    path, *_ = _save(node_module)
+
+    assert os.path.basename(path) == "P_00004_.safetensors"
+
+
+def test_hint_resets_after_an_unsuffixed_save(node_module):
+    paths = [_save(node_module)[0] for _ in range(2)]
+    for path in paths:
+        os.remove(path)
+
+    paths = [_save(node_module)[0] for _ in range(2)]
+
+    assert _names(paths) == ["P.safetensors", "P_00001_.safetensors"]
+
+
+def test_failed_save_does_not_advance_the_counter(node_module, monkeypatch):
+    _save(node_module)
+
+    def fail(self, save_path, **kwargs):
+        raise RuntimeError("disk full")
+
+    with monkeypatch.context() as m:
+        m.setattr(node_module.SaveCheckpointWithMetadata, "_save_file", fail)
+        with pytest.raises(RuntimeError):
+            _save(node_module)
+
+    path, *_ = _save(node_module)
+
+    assert os.path.basename(path) == "P_00001_.safetensors"
+
+
+def test_smart_counter_restarts_in_a_deleted_folder(node_module):
+    paths = [_save(node_module)[0] for _ in range(2)]
+    shutil.rmtree(os.path.dirname(paths[0]))
+
+    paths = [_save(node_module)[0] for _ in range(2)]
+
+    assert _names(paths) == ["P.safetensors", "P_00001_.safetensors"]
+
+
+@pytest.mark.parametrize("metadata_json", ["", "  ", "{}", " {} "])
+def test_blank_metadata_json_writes_no_metadata(node_module, metadata_json):
+    path, saved_metadata, _prompt, _extra = _save(node_module, metadata_json=metadata_json)
+
+    with safe_open(path, framework="pt") as f:
+        assert not f.metadata()
+    assert saved_metadata == "{}"
+
+
+@pytest.mark.parametrize("metadata_json", ["null", "[]", '"text"', "1"])
+def test_non_object_metadata_json_is_rejected(node_module, metadata_json):
+    with pytest.raises(ValueError, match="must be a JSON object"):
+        _save(node_module, metadata_json=metadata_json)
+
+
+def test_invalid_metadata_json_is_rejected(node_module):
+    with pytest.raises(ValueError, match="Invalid metadata_json"):
+        _save(node_module, metadata_json='{"a": }')